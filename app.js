@@ -364,7 +364,7 @@ class ZapSuite {
         this.connectToLogStream(sessionId, testInfo);
         
         try {
-            const response = await fetch('/api/run-test', {
+            const response = await fetch('/api/run-test?include_raw=1', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -5,73 +5,264 @@ Handles test execution and provides API endpoints for the GUI
 """
 
 import os
-import json
+import re
 import time
 import yaml
+import orjson
+import logging
+import functools
+import itertools
 import subprocess
 import tempfile
 import asyncio
+import collections
 import concurrent.futures
+import queue
 import uuid
 import threading
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_template_string
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson so jsonify serializes large test
+    results with the C implementation instead of stdlib json"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # Global configuration
 CONFIG_FILE = 'test-suite-config-local.yaml'
 config = None
 
-# Global log streaming system
-active_logs = {}  # session_id -> log messages
-log_subscribers = {}  # session_id -> list of event streams
-log_lock = threading.Lock()
+# Snapshot of the inherited environment taken once at import; per-test envs
+# are built from it with a single dict construction instead of going through
+# os.environ.copy() (which re-decodes every entry on POSIX) per call
+_BASE_ENV = dict(os.environ)
+_CODE_CONTEXT_BIN = '/Users/sarangsharma/code/code-context/modules/code-context/code-context'
+
+# Verbose command/environment dumps are gated so production runs skip the
+# string assembly and stdio flushes entirely
+DEBUG = bool(os.environ.get('ZAP_DEBUG'))
+logger = logging.getLogger(__name__)
+if DEBUG:
+    # Nothing else configures logging, so without a handler and DEBUG level
+    # here the debug records would be dropped at the root logger's default
+    # WARNING threshold
+    logging.basicConfig(level=logging.DEBUG)
+
+# Pre-compiled patterns for output cleanup and JSON extraction (compiled once
+# at import instead of per call)
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*[mK]')
+# Noise patterns bucketed by leading literal character (ESC, spinner glyphs,
+# 'T') so each compiled pattern keeps a prefix the regex scanner can skip to
+# with the C-level memchr fast path instead of one wide alternation. Each
+# bucket carries cheap substring probes: a str `in` scan runs orders of
+# magnitude faster than the regex engine, so buckets whose noise never
+# appears in the buffer are skipped entirely
+_NOISE_RES = (
+    (tuple('⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏'), re.compile(r'[⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏](?:\s*Thinking\.\.\.)?')),
+    (('Thinking...', 'Tool '), re.compile(r'Thinking\.\.\.|Tool \w+ execution time: \d+ms')),
+)
+
+# Final bytes that terminate a CSI escape sequence
+_CSI_FINAL = frozenset('@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~')
+
+def _strip_ansi_fast(s):
+    """Single-pass ANSI stripper: memchr-style find() jumps to each escape,
+    the parameter bytes are skipped up to the sequence's final byte, and the
+    clean slices between escapes are copied out. Unlike _ANSI_RE this doesn't
+    restart the regex engine per escape, and it drops every CSI sequence, not
+    just color/erase codes."""
+    parts = []
+    pos = 0
+    n = len(s)
+    find = s.find
+    while True:
+        esc = find('\x1b[', pos)
+        if esc == -1:
+            parts.append(s[pos:])
+            return ''.join(parts)
+        parts.append(s[pos:esc])
+        i = esc + 2
+        while i < n and s[i] not in _CSI_FINAL:
+            i += 1
+        pos = i + 1
+_TOOL_TIME_RE = re.compile(r'Tool (\w+) execution time: (\d+)ms')
+# Bytes twin of _TOOL_TIME_RE for the streaming reader, which keeps wingman
+# stdout undecoded
+_TOOL_TIME_RE_B = re.compile(rb'Tool (\w+) execution time: (\d+)ms')
+# Whitespace normalization fused into one alternation: blank-line runs
+# collapse to a single newline, space runs to a single space, in one pass
+# over the buffer instead of four. Leading/trailing cleanup is covered by
+# the final .strip() in clean_raw_output.
+_WS_NOISE_RE = re.compile(r'\n\s*\n| {2,}')
+
+def _ws_repl(match):
+    return '\n' if match.group()[0] == '\n' else ' '
+# The backtick pattern is the one remaining lazy-quantifier search over the
+# full (possibly multi-MB) raw buffer. google-re2's linear-time engine can't
+# backtrack pathologically there, so prefer it when installed; the pattern
+# uses no lookaround or backrefs, so semantics match stdlib re.
+try:
+    import re2 as _re2
+    _JSON_BACKTICK_RE = _re2.compile(r'```json\s*(.*?)\s*```', _re2.DOTALL)
+except ImportError:
+    _JSON_BACKTICK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+# Matches both forms create_index reports its result in: the plain
+# INDEX_PATH= line marker and the "index_path" field of the JSON output
+_INDEX_PATH_RE = re.compile(r'(?:INDEX_PATH=|"index_path"\s*:\s*")([^\s"]+)')
+def _looks_like_balanced_json(s):
+    """Cheap structural check for a candidate snippet: braces and brackets
+    must nest correctly and every string literal must close. Obvious junk is
+    rejected without the caller ever invoking the parser; the rare false
+    positive is caught by the caller's own validating parse."""
+    if not s or s[0] not in '{[':
+        return False
+    stack = []
+    in_string = False
+    escape = False
+    for ch in s:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if not stack or stack.pop() != ch:
+                return False
+    return not stack and not in_string
+
+def _extract_json_by_depth(text, marker):
+    """Find the JSON object containing *marker* with a brace-depth scan:
+    locate the quoted key, then walk outward through the '{' positions
+    before it until one opens an object that actually spans the marker. The
+    nearest preceding '{' may open a sibling that closes before the key
+    (e.g. a nested object in an earlier field), so candidates whose closing
+    brace lands before the marker are rejected and the scan backs up to the
+    next-outer brace. Each spanning candidate is validated with one orjson
+    parse; a marker inside broken output moves on to its next occurrence."""
+    n = len(text)
+    start = text.find(marker)
+    while start != -1:
+        open_idx = text.rfind('{', 0, start + 1)
+        while open_idx != -1:
+            depth = 0
+            in_string = False
+            escape = False
+            for i in range(open_idx, n):
+                ch = text[i]
+                if in_string:
+                    if escape:
+                        escape = False
+                    elif ch == '\\':
+                        escape = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch == '{':
+                    depth += 1
+                elif ch == '}':
+                    depth -= 1
+                    if depth == 0:
+                        if i >= start:
+                            candidate = text[open_idx:i + 1]
+                            try:
+                                orjson.loads(candidate)
+                                return candidate
+                            except orjson.JSONDecodeError:
+                                pass
+                        break
+            open_idx = text.rfind('{', 0, open_idx)
+        start = text.find(marker, start + 1)
+    return None
+
+def _now_iso(_cache=[0.0, '']):
+    """ISO timestamp with ~50ms granularity. datetime.now().isoformat() costs
+    a syscall plus object construction and string formatting per call; hot
+    paths (log broadcasts, error fills under failure storms) only need a
+    human-scale timestamp, so the formatted string is cached and refreshed at
+    most every 50ms. Racing threads may refresh concurrently, which is
+    harmless — both write a current value."""
+    t = time.monotonic()
+    if t - _cache[0] > 0.05:
+        _cache[:] = [t, datetime.now().isoformat()]
+    return _cache[1]
+
+# Global log streaming system. State is sharded per session so concurrent
+# tests broadcasting logs never contend on one global mutex; the global lock
+# below only guards creation of a session's lock shard. Backlogs are bounded
+# deques so long-running sessions can't grow without limit.
+_LOG_BACKLOG_MAX = 10000
+active_logs = {}  # session_id -> bounded deque of log entries
+log_subscribers = {}  # session_id -> set of subscriber queues
+log_locks = {}  # session_id -> lock shard
+_locks_lock = threading.Lock()
+
+def _session_lock(session_id):
+    """Get (or lazily create) the lock shard for a session"""
+    lock = log_locks.get(session_id)
+    if lock is None:
+        with _locks_lock:
+            lock = log_locks.setdefault(session_id, threading.Lock())
+    return lock
 
 def broadcast_log(session_id, message):
     """Broadcast a log message to all subscribers"""
-    with log_lock:
+    # One timestamp and one entry dict per broadcast; the same reference is
+    # stored and handed to every subscriber (consumers only read it)
+    entry = {
+        "timestamp": _now_iso(),
+        "message": message,
+        "session_id": session_id
+    }
+    with _session_lock(session_id):
         # Store the message
         if session_id not in active_logs:
-            active_logs[session_id] = []
-        active_logs[session_id].append({
-            "timestamp": datetime.now().isoformat(),
-            "message": message
-        })
-        
+            active_logs[session_id] = collections.deque(maxlen=_LOG_BACKLOG_MAX)
+        active_logs[session_id].append(entry)
+
         # Notify all subscribers
         if session_id in log_subscribers:
             # Create a copy of subscribers to avoid modification during iteration
             subscribers = list(log_subscribers[session_id])
             for subscriber_queue in subscribers:
                 try:
-                    subscriber_queue.put({
-                        "timestamp": datetime.now().isoformat(),
-                        "message": message,
-                        "session_id": session_id
-                    })
+                    subscriber_queue.put(entry)
                 except:
-                    # Remove dead subscribers
-                    try:
-                        log_subscribers[session_id].remove(subscriber_queue)
-                    except ValueError:
-                        pass
+                    # Remove dead subscribers - discard never raises
+                    log_subscribers[session_id].discard(subscriber_queue)
 
 def generate_log_stream(session_id):
     """Generator for Server-Sent Events log stream"""
-    import queue
-    
     # Create a queue for this subscriber
-    log_queue = queue.Queue()
-    
-    with log_lock:
+    # SimpleQueue's C implementation skips the Condition/unfinished-task
+    # bookkeeping of queue.Queue; nothing here uses task_done/join
+    log_queue = queue.SimpleQueue()
+
+    with _session_lock(session_id):
         # Add this subscriber to the session
         if session_id not in log_subscribers:
-            log_subscribers[session_id] = []
-        log_subscribers[session_id].append(log_queue)
+            log_subscribers[session_id] = set()
+        log_subscribers[session_id].add(log_queue)
         
         # Send existing logs to new subscriber
         if session_id in active_logs:
@@ -86,124 +277,137 @@ def generate_log_stream(session_id):
             try:
                 # Wait for new log messages
                 log_entry = log_queue.get(timeout=30)  # 30 second timeout for keepalive
-                yield f"data: {json.dumps(log_entry)}\n\n"
+                # orjson emits bytes directly; Flask streams them as-is, so
+                # each frame skips the stdlib encoder and a str->bytes copy
+                yield b"data: " + orjson.dumps(log_entry) + b"\n\n"
             except queue.Empty:
                 # Send keepalive
-                yield "data: {\"type\": \"keepalive\"}\n\n"
+                yield b'data: {"type": "keepalive"}\n\n'
     finally:
         # Cleanup subscriber
-        with log_lock:
-            if session_id in log_subscribers and log_queue in log_subscribers[session_id]:
-                try:
-                    log_subscribers[session_id].remove(log_queue)
-                except ValueError:
-                    pass
+        with _session_lock(session_id):
+            if session_id in log_subscribers:
+                log_subscribers[session_id].discard(log_queue)
+
+# Constant argv prefixes; the wingman prefix is resolved once per config
+# load so per-test command assembly repeats no config dict lookups
+_CREATE_INDEX_PREFIX = (_CODE_CONTEXT_BIN, 'create_index', '-r')
+_WINGMAN_PREFIX = ()
+
+try:
+    # libyaml C tokenizer when the PyYAML wheel ships it - several times
+    # faster than the pure-Python loader
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+@functools.lru_cache(maxsize=16)
+def _load_yaml(path, mtime_ns, size):
+    """Parse a YAML file; (mtime_ns, size) is part of the cache key purely so
+    file edits invalidate the cached parse"""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=_YamlLoader)
 
 def load_config():
-    """Load configuration from YAML file"""
-    global config
+    """Load configuration from YAML file (cached until the file changes)"""
+    global config, _WINGMAN_PREFIX
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = yaml.safe_load(f)
+        st = os.stat(CONFIG_FILE)
+        config = _load_yaml(CONFIG_FILE, st.st_mtime_ns, st.st_size)
+        _WINGMAN_PREFIX = (config['wingman_binary_path'], '-v',
+                           '-c', config['wingman_config_path'])
         return True
     except Exception as e:
         print(f"Error loading config: {e}")
         return False
 
+# Load once at import so the first request doesn't pay for it and WSGI
+# servers importing via wsgi.py start warm. A missing file isn't fatal here -
+# endpoints retry (cheaply, thanks to the mtime cache) in case it appears
+# after startup.
+load_config()
+
 def clean_raw_output(raw_output):
     """Clean raw output by removing spinner noise, ANSI sequences, and other unwanted content"""
     if not raw_output:
         return ""
     
     try:
-        import re
-        
-        # Remove ANSI escape sequences
-        cleaned = re.sub(r'\x1b\[[0-9;]*[mK]', '', raw_output)
-        
-        # Remove spinner characters and their combinations
-        cleaned = re.sub(r'[⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏]', '', cleaned)
-        
-        # Remove repetitive "Thinking..." patterns (more comprehensive)
-        cleaned = re.sub(r'[⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏]\s*Thinking\.\.\.', '', cleaned)
-        cleaned = re.sub(r'Thinking\.\.\.', '', cleaned)
-        
-        # Remove tool execution time messages
-        cleaned = re.sub(r'Tool \w+ execution time: \d+ms', '', cleaned)
-        
-        # Remove empty lines and normalize whitespace
-        cleaned = re.sub(r'\n\s*\n', '\n', cleaned)  # Multiple newlines to single
-        cleaned = re.sub(r'^\s*\n', '', cleaned)  # Leading empty lines
-        cleaned = re.sub(r'\n\s*$', '', cleaned)  # Trailing empty lines
-        cleaned = re.sub(r' +', ' ', cleaned)  # Multiple spaces to single
-        
+        # Strip ANSI escapes with the manual scanner (regex as safety net),
+        # then spinner frames, "Thinking..." chatter and tool timing lines
+        # one bucket at a time; buckets with no probe hit are skipped without
+        # touching the regex engine
+        cleaned = raw_output
+        if '\x1b' in cleaned:
+            try:
+                cleaned = _strip_ansi_fast(cleaned)
+            except Exception:
+                cleaned = _ANSI_RE.sub('', cleaned)
+        for probes, noise_re in _NOISE_RES:
+            if any(probe in cleaned for probe in probes):
+                cleaned = noise_re.sub('', cleaned)
+
+        # Remove empty lines and normalize whitespace in a single fused pass
+        cleaned = _WS_NOISE_RE.sub(_ws_repl, cleaned)
+
         return cleaned.strip()
         
     except Exception as e:
         print(f"Error cleaning raw output: {e}")
         return raw_output
 
+def _from_backtick_block(text):
+    """Candidate from a ```json fence - the most reliable and cheapest
+    strategy, since the captured block is tiny compared to the buffer. The
+    balance check is a cheap prefilter; survivors are orjson-validated so a
+    noise-contaminated block (which can still balance) returns None and the
+    ladder moves on instead of serving an unparseable candidate"""
+    json_match = _JSON_BACKTICK_RE.search(text)
+    if json_match:
+        json_content = _ANSI_RE.sub('', json_match.group(1)).strip()
+        if _looks_like_balanced_json(json_content):
+            try:
+                orjson.loads(json_content)
+                return json_content
+            except orjson.JSONDecodeError:
+                return None
+    return None
+
+# Extraction strategies in observed hit-rate order: (name, needs_cleaned,
+# extractor). The first entry works on the raw buffer; the rest need the
+# sanitized text, which is produced at most once per call. The fence gets a
+# second, cleaned attempt because spinner glyphs or interleaved progress
+# lines inside the block defeat the raw pass but wash out in cleanup.
+# _JSON_HITS counts which strategy matched so the order can be revisited
+# against real traffic.
+_JSON_EXTRACTORS = (
+    ('backtick_block', False, _from_backtick_block),
+    ('backtick_block_cleaned', True, _from_backtick_block),
+    ('evaluation_results', True,
+     lambda text: _extract_json_by_depth(text, '"evaluation_results"')),
+    ('analysis_results', True,
+     lambda text: _extract_json_by_depth(text, '"analysis_results"')),
+)
+_JSON_HITS = collections.Counter()
+
 def extract_json_from_output(raw_output):
     """Extract clean JSON from wingman output - simplified approach for direct JSON extraction"""
     if not raw_output:
         return None
-    
+
     try:
-        import re
-        
-        # First clean the output
-        cleaned = clean_raw_output(raw_output)
-        
-        # Look for JSON content in backticks first (most reliable)
-        json_match = re.search(r'```json\s*(.*?)\s*```', cleaned, re.DOTALL)
-        if json_match:
-            json_content = json_match.group(1).strip()
-            try:
-                json.loads(json_content)
-                return json_content
-            except json.JSONDecodeError:
-                pass
-        
-        # Direct approach: Look for evaluation_results JSON pattern (single line)
-        json_match = re.search(r'(\{"evaluation_results":\[.*?\]\})', cleaned)
-        if json_match:
-            json_content = json_match.group(1).strip()
-            try:
-                json.loads(json_content)
-                return json_content
-            except json.JSONDecodeError:
-                pass
-        
-        # Fallback: Look for analysis_results JSON pattern (single line) 
-        json_match = re.search(r'(\{"analysis_results":\[.*?\]\})', cleaned)
-        if json_match:
-            json_content = json_match.group(1).strip()
-            try:
-                json.loads(json_content)
-                return json_content
-            except json.JSONDecodeError:
-                pass
-        
-        # Multi-line fallback for evaluation_results
-        json_match = re.search(r'(\{[^}]*"evaluation_results":\s*\[[\s\S]*?\]\s*\})', cleaned)
-        if json_match:
-            json_content = json_match.group(1).strip()
-            try:
-                json.loads(json_content)
-                return json_content
-            except json.JSONDecodeError:
-                pass
-        
-        # Multi-line fallback for analysis_results
-        json_match = re.search(r'(\{[^}]*"analysis_results":\s*\[[\s\S]*?\]\s*\})', cleaned)
-        if json_match:
-            json_content = json_match.group(1).strip()
-            try:
-                json.loads(json_content)
-                return json_content
-            except json.JSONDecodeError:
-                pass
-            
+        cleaned = None
+        for name, needs_cleaned, extract in _JSON_EXTRACTORS:
+            if needs_cleaned:
+                if cleaned is None:
+                    cleaned = clean_raw_output(raw_output)
+                candidate = extract(cleaned)
+            else:
+                candidate = extract(raw_output)
+            if candidate:
+                _JSON_HITS[name] += 1
+                return candidate
+        _JSON_HITS['no_match'] += 1
         return None
     except Exception as e:
         print(f"Error extracting JSON: {e}")
@@ -213,23 +417,29 @@ def extract_tool_analytics(raw_output):
     """Extract tool execution analytics from raw output"""
     if not raw_output:
         return {}
-    
+
+    # Cheap substring probe before the regex walk - runs with no tool
+    # invocations skip the pattern scan entirely
+    if 'execution time:' not in raw_output:
+        return {
+            "tools_executed": [],
+            "total_execution_time": 0,
+            "tool_count": 0,
+            "total_execution_time_s": 0.0
+        }
+
     try:
-        import re
         analytics = {
             "tools_executed": [],
             "total_execution_time": 0,
             "tool_count": 0
         }
-        
-        # Find all tool execution patterns
-        tool_pattern = r'Tool (\w+) execution time: (\d+)ms'
-        matches = re.findall(tool_pattern, raw_output)
-        
-        for tool_name, execution_time in matches:
-            execution_time_ms = int(execution_time)
+
+        # Walk tool execution patterns lazily - no intermediate match list
+        for match in _TOOL_TIME_RE.finditer(raw_output):
+            execution_time_ms = int(match.group(2))
             analytics["tools_executed"].append({
-                "tool": tool_name,
+                "tool": match.group(1),
                 "execution_time_ms": execution_time_ms,
                 "execution_time_s": round(execution_time_ms / 1000, 2)
             })
@@ -243,14 +453,111 @@ def extract_tool_analytics(raw_output):
         print(f"Error extracting tool analytics: {e}")
         return {}
 
+# Last known checked-out branch per repo. The repos are the user's own
+# working trees and can be switched between API calls, so the cache is only
+# a hint: a hit is confirmed against HEAD before the checkout machinery is
+# skipped
+_BRANCH_CACHE = {}
+_BRANCH_LOCK = threading.Lock()
+
+try:
+    # libgit2 bindings: ref lookup and checkout become in-process C calls
+    # instead of two git fork/execs per checkout. Optional - the subprocess
+    # path below remains the fallback.
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+def _checkout_branch_pygit2(repo_path, branch_name):
+    """Checkout via libgit2, keeping checkout_branch's (bool, msg) contract.
+    Returns None on any libgit2 surprise so the caller falls back to the
+    battle-tested subprocess path."""
+    try:
+        repo = pygit2.Repository(repo_path)
+        if not repo.head_is_unborn and not repo.head_is_detached \
+                and repo.head.shorthand == branch_name:
+            return True, f"Already on branch '{branch_name}'"
+
+        branch = repo.lookup_branch(branch_name)
+        if branch is None:
+            remote = repo.lookup_branch(f'origin/{branch_name}',
+                                        pygit2.GIT_BRANCH_REMOTE)
+            if remote is None:
+                return False, f"Branch '{branch_name}' does not exist in repository"
+            branch = repo.branches.local.create(branch_name, repo.get(remote.target))
+            branch.upstream = remote
+
+        repo.checkout(branch)
+        repo.set_head(branch.name)
+        return True, f"Successfully checked out branch '{branch_name}'"
+    except Exception:
+        return None
+
+def _current_branch(repo_path):
+    """Name of the branch HEAD points at, or None (detached, unborn, or any
+    lookup failure). In-process via pygit2 when available, one
+    'git branch --show-current' otherwise."""
+    if pygit2 is not None:
+        try:
+            repo = pygit2.Repository(repo_path)
+            if not repo.head_is_unborn and not repo.head_is_detached:
+                return repo.head.shorthand
+            return None
+        except Exception:
+            pass
+    try:
+        result = subprocess.run(
+            ['git', 'branch', '--show-current'],
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        pass
+    return None
+
+def _git_ref_exists(repo_path, ref):
+    """Check a ref with rev-parse --verify (no O(refs) listing/formatting)"""
+    result = subprocess.run(
+        ['git', 'rev-parse', '--verify', '--quiet', ref],
+        cwd=repo_path,
+        capture_output=True,
+        timeout=10
+    )
+    return result.returncode == 0
+
 def checkout_branch(repo_path, branch_name):
     """Checkout the specified branch with error handling and parallel execution safety"""
     import time
     import random
-    
+
     try:
+        # Fast path: we checked this branch out for this repo earlier. The
+        # user may have switched branches in the working tree since, so
+        # confirm HEAD still matches before trusting the cache; a stale hit
+        # is evicted and falls through to the real checkout path
+        with _BRANCH_LOCK:
+            cached = _BRANCH_CACHE.get(repo_path)
+        if cached == branch_name:
+            if _current_branch(repo_path) == branch_name:
+                return True, f"Already on branch '{branch_name}'"
+            with _BRANCH_LOCK:
+                if _BRANCH_CACHE.get(repo_path) == branch_name:
+                    del _BRANCH_CACHE[repo_path]
+
+        if pygit2 is not None:
+            pygit2_result = _checkout_branch_pygit2(repo_path, branch_name)
+            if pygit2_result is not None:
+                if pygit2_result[0]:
+                    with _BRANCH_LOCK:
+                        _BRANCH_CACHE[repo_path] = branch_name
+                return pygit2_result
+
         print(f"Checking out branch '{branch_name}' in {repo_path}")
-        
+
         # First, check if we're already on the correct branch
         result = subprocess.run(
             ['git', 'branch', '--show-current'],
@@ -259,31 +566,19 @@ def checkout_branch(repo_path, branch_name):
             text=True,
             timeout=10
         )
-        
+
         if result.returncode == 0:
             current_branch = result.stdout.strip()
             if current_branch == branch_name:
                 print(f"Already on branch '{branch_name}', skipping checkout")
+                with _BRANCH_LOCK:
+                    _BRANCH_CACHE[repo_path] = branch_name
                 return True, f"Already on branch '{branch_name}'"
-        
-        # Check if the branch exists
-        result = subprocess.run(
-            ['git', 'branch', '-a'],
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode != 0:
-            return False, f"Failed to list branches: {result.stderr}"
-        
-        # Check if branch exists (locally or remotely)
-        branches_output = result.stdout
-        local_branch_exists = f"  {branch_name}" in branches_output or f"* {branch_name}" in branches_output
-        remote_branch_exists = f"remotes/origin/{branch_name}" in branches_output
-        
-        if not local_branch_exists and not remote_branch_exists:
+
+        # Check if branch exists (locally or remotely); rev-parse is a ref
+        # lookup rather than a full 'git branch -a' listing and text match
+        if not _git_ref_exists(repo_path, f'refs/heads/{branch_name}') and \
+                not _git_ref_exists(repo_path, f'refs/remotes/origin/{branch_name}'):
             return False, f"Branch '{branch_name}' does not exist in repository"
         
         # Retry logic for git checkout with exponential backoff
@@ -307,6 +602,8 @@ def checkout_branch(repo_path, branch_name):
                 
                 if result.returncode == 0:
                     print(f"Successfully checked out branch '{branch_name}'")
+                    with _BRANCH_LOCK:
+                        _BRANCH_CACHE[repo_path] = branch_name
                     return True, f"Successfully checked out branch '{branch_name}'"
                 else:
                     error_msg = result.stderr.strip()
@@ -330,43 +627,72 @@ def checkout_branch(repo_path, branch_name):
     except Exception as e:
         return False, f"Error checking out branch '{branch_name}': {str(e)}"
 
-def save_raw_output(output_path, repo_name, input_file, run_number, stdout, stderr, success):
+# Raw-output files are written on a single background thread so test workers
+# can pick up the next result while the disk write completes
+_IO_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='raw-io')
+
+def save_raw_output_async(output_path, repo_name, input_file, run_number, stdout, stderr, success, timestamp=None):
+    """Queue save_raw_output on the background writer thread and return the
+    target paths immediately; write failures are logged from the worker"""
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = Path(output_path)
+    base_filename = f"{Path(repo_name).name}_{Path(input_file).stem}_run{run_number}_{timestamp}"
+    stderr_file = output_dir / f"{base_filename}_stderr.txt" if stderr else None
+
+    _IO_EXECUTOR.submit(save_raw_output, output_path, repo_name, input_file,
+                        run_number, stdout, stderr, success, timestamp)
+
+    return {
+        "stdout_file": str(output_dir / f"{base_filename}_stdout.txt"),
+        "stderr_file": str(stderr_file) if stderr_file else None
+    }
+
+def save_raw_output(output_path, repo_name, input_file, run_number, stdout, stderr, success, timestamp=None):
     """Save raw output and error to files in the output directory"""
     try:
         # Create output directory if it doesn't exist
         output_dir = Path(output_path)
         output_dir.mkdir(parents=True, exist_ok=True)
-        
+
         # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         repo_clean = Path(repo_name).name  # Get just the repo name, not full path
         input_clean = Path(input_file).stem  # Remove extension
-        
+
         base_filename = f"{repo_clean}_{input_clean}_run{run_number}_{timestamp}"
-        
-        # Save stdout
+        written_at = datetime.now().isoformat()
+
+        def as_bytes(data, fallback=b""):
+            # The streaming capture hands us bytes; strings from error paths
+            # are encoded here, so the common path never decodes the buffer
+            if isinstance(data, bytes):
+                return data or fallback
+            return data.encode('utf-8') if data else fallback
+
+        # Save stdout - header and payload go out in one write call per file
+        # (write_bytes is a single open/write/close)
         stdout_file = output_dir / f"{base_filename}_stdout.txt"
-        with open(stdout_file, 'w', encoding='utf-8') as f:
-            f.write(f"# Raw Output - {datetime.now().isoformat()}\n")
-            f.write(f"# Repository: {repo_name}\n")
-            f.write(f"# Input File: {input_file}\n")
-            f.write(f"# Run Number: {run_number}\n")
-            f.write(f"# Success: {success}\n")
-            f.write(f"# {'='*50}\n\n")
-            f.write(stdout or "No stdout output")
-        
+        header = (f"# Raw Output - {written_at}\n"
+                  f"# Repository: {repo_name}\n"
+                  f"# Input File: {input_file}\n"
+                  f"# Run Number: {run_number}\n"
+                  f"# Success: {success}\n"
+                  f"# {'='*50}\n\n").encode('utf-8')
+        stdout_file.write_bytes(header + as_bytes(stdout, b"No stdout output"))
+
         # Save stderr if exists
         stderr_file = None
         if stderr:
             stderr_file = output_dir / f"{base_filename}_stderr.txt"
-            with open(stderr_file, 'w', encoding='utf-8') as f:
-                f.write(f"# Error Output - {datetime.now().isoformat()}\n")
-                f.write(f"# Repository: {repo_name}\n")
-                f.write(f"# Input File: {input_file}\n")
-                f.write(f"# Run Number: {run_number}\n")
-                f.write(f"# Success: {success}\n")
-                f.write(f"# {'='*50}\n\n")
-                f.write(stderr)
+            header = (f"# Error Output - {written_at}\n"
+                      f"# Repository: {repo_name}\n"
+                      f"# Input File: {input_file}\n"
+                      f"# Run Number: {run_number}\n"
+                      f"# Success: {success}\n"
+                      f"# {'='*50}\n\n").encode('utf-8')
+            stderr_file.write_bytes(header + as_bytes(stderr))
         
         print(f"Raw output saved to: {stdout_file}")
         if stderr_file:
@@ -381,15 +707,36 @@ def save_raw_output(output_path, repo_name, input_file, run_number, stdout, stde
         print(f"Warning: Failed to save raw output: {e}")
         return None
 
+# Cached input-file listings keyed by directory path, invalidated when the
+# directory mtime changes
+_INPUTS_CACHE = {}
+_INPUTS_LOCK = threading.Lock()
+
 def get_input_files(inputs_path):
-    """Get all .txt files from inputs directory"""
+    """Get all .txt files from inputs directory (cached by directory mtime)"""
     try:
-        inputs_dir = Path(inputs_path)
-        return [f.name for f in inputs_dir.glob('*.txt')]
+        mtime_ns = os.stat(inputs_path).st_mtime_ns
+        with _INPUTS_LOCK:
+            cached = _INPUTS_CACHE.get(inputs_path)
+            if cached and cached[0] == mtime_ns:
+                return cached[1]
+
+        with os.scandir(inputs_path) as entries:
+            files = [e.name for e in entries
+                     if e.name.endswith('.txt') and e.is_file(follow_symlinks=False)]
+
+        with _INPUTS_LOCK:
+            _INPUTS_CACHE[inputs_path] = (mtime_ns, files)
+        return files
     except Exception as e:
         print(f"Error getting input files: {e}")
         return []
 
+# Created index paths keyed by (repo_path, branch, HEAD sha); the index is a
+# function of the checked-out commit, so rebuilds are skipped until it moves
+_INDEX_CACHE = {}
+_INDEX_LOCK = threading.Lock()
+
 def create_index_for_repo(repo_path, branch_name=None, session_id=None):
     """Create code context index for a repository/branch combination"""
     if session_id is None:
@@ -413,22 +760,38 @@ def create_index_for_repo(repo_path, branch_name=None, session_id=None):
                 }
             else:
                 broadcast_log(session_id, f"✅ {branch_message}")
-        
+
+        # Reuse a previously built index when HEAD hasn't moved
+        cache_key = None
+        head = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        if head.returncode == 0:
+            cache_key = (repo_path, branch_name, head.stdout.strip())
+            with _INDEX_LOCK:
+                cached_path = _INDEX_CACHE.get(cache_key)
+            if cached_path:
+                broadcast_log(session_id, f"📇 Reusing cached index: {cached_path}")
+                return {
+                    "success": True,
+                    "index_path": cached_path,
+                    "cached": True
+                }
+
         # Set up environment variables
         broadcast_log(session_id, "🔧 Setting up environment variables...")
-        env = os.environ.copy()
-        env['PERPLEXITY_API_KEY'] = config['perplexity_key']
-        env['BWM_CODE_CONTEXT_BIN_PATH'] = '/Users/sarangsharma/code/code-context/modules/code-context/code-context'
+        env = {**_BASE_ENV,
+               'PERPLEXITY_API_KEY': config['perplexity_key'],
+               'BWM_CODE_CONTEXT_BIN_PATH': _CODE_CONTEXT_BIN}
         broadcast_log(session_id, "✅ Environment variables configured")
-        
+
         # Create index
         broadcast_log(session_id, "📇 Creating code context index...")
-        create_index_cmd = [
-            env['BWM_CODE_CONTEXT_BIN_PATH'],
-            'create_index',
-            '-r',
-            repo_path
-        ]
+        create_index_cmd = [*_CREATE_INDEX_PREFIX, repo_path]
         
         index_creation_output = ""
         index_creation_error = ""
@@ -446,26 +809,20 @@ def create_index_for_repo(repo_path, branch_name=None, session_id=None):
         index_creation_error = result.stderr or ""
         
         if result.returncode == 0:
-            # Parse index path from JSON output
-            index_path = None
+            # create_index normally emits a JSON document, so try one direct
+            # orjson parse with a guarded .get chain; the precompiled search
+            # covers the plain INDEX_PATH= line form if the parse fails
             try:
-                output_json = json.loads(result.stdout)
-                if 'output' in output_json and len(output_json['output']) > 0:
-                    index_path = output_json['output'][0].get('index_path')
-                else:
-                    # Fallback to parsing stdout for index_path
-                    for line in result.stdout.split('\n'):
-                        if 'INDEX_PATH=' in line:
-                            index_path = line.split('INDEX_PATH=')[1].strip()
-                            break
-            except:
-                # Fallback to parsing stdout for index_path
-                for line in result.stdout.split('\n'):
-                    if 'INDEX_PATH=' in line:
-                        index_path = line.split('INDEX_PATH=')[1].strip()
-                        break
-            
+                output_json = orjson.loads(result.stdout)
+                index_path = (output_json.get('output') or [{}])[0].get('index_path')
+            except (orjson.JSONDecodeError, AttributeError, IndexError, TypeError):
+                index_match = _INDEX_PATH_RE.search(result.stdout)
+                index_path = index_match.group(1) if index_match else None
+
             if index_path:
+                if cache_key:
+                    with _INDEX_LOCK:
+                        _INDEX_CACHE[cache_key] = index_path
                 broadcast_log(session_id, f"✅ Index created successfully: {index_path}")
                 return {
                     "success": True,
@@ -473,7 +830,7 @@ def create_index_for_repo(repo_path, branch_name=None, session_id=None):
                     "creation_output": index_creation_output,
                     "commands": {
                         "create_index": " ".join(create_index_cmd)
-                    }
+                    } if DEBUG else None
                 }
             else:
                 error_msg = "Index creation succeeded but no index path found"
@@ -495,7 +852,7 @@ def create_index_for_repo(repo_path, branch_name=None, session_id=None):
                 "creation_error": index_creation_error,
                 "commands": {
                     "create_index": " ".join(create_index_cmd)
-                }
+                } if DEBUG else None
             }
         
     except subprocess.TimeoutExpired:
@@ -517,10 +874,21 @@ def create_index_for_repo(repo_path, branch_name=None, session_id=None):
             "exception": True
         }
 
-def run_wingman_test(repo_path, input_file_path, inputs_path, output_path, run_number, index_path=None, session_id=None):
+def _env_for_repo(index_path=None):
+    """Build the wingman subprocess environment once. Tests sharing an index
+    can reuse the returned dict instead of copying the whole environment per
+    invocation; nothing downstream mutates it."""
+    env = {**_BASE_ENV,
+           'PERPLEXITY_API_KEY': config['perplexity_key'],
+           'BWM_CODE_CONTEXT_BIN_PATH': _CODE_CONTEXT_BIN}
+    if index_path:
+        env['BWM_CODE_CONTEXT_INDEX'] = index_path
+    return env
+
+def run_wingman_test(repo_path, input_file_path, inputs_path, output_path, run_number, index_path=None, session_id=None, include_raw=False, env=None):
     """Run a single wingman test with pre-created index"""
     start_time = time.time()
-    stdout_output = ""
+    stdout_output = b""
     stderr_output = ""
     
     # Generate unique session ID for this test if not provided
@@ -532,18 +900,23 @@ def run_wingman_test(repo_path, input_file_path, inputs_path, output_path, run_n
         broadcast_log(session_id, f"🚀 Starting test: {input_file_path} (Run {run_number})")
         broadcast_log(session_id, f"📁 Repository: {repo_path}")
         
-        # Set up environment variables
+        # Set up environment variables - the batch path passes a prebuilt
+        # per-repo env so we don't copy the whole environment per test
         broadcast_log(session_id, "🔧 Setting up environment variables...")
-        env = os.environ.copy()
-        env['PERPLEXITY_API_KEY'] = config['perplexity_key']
-        env['BWM_CODE_CONTEXT_BIN_PATH'] = '/Users/sarangsharma/code/code-context/modules/code-context/code-context'
-        
-        # Use provided index path
         if index_path:
-            env['BWM_CODE_CONTEXT_INDEX'] = index_path
+            if env is None:
+                env = _env_for_repo(index_path)
             broadcast_log(session_id, f"📇 Using existing index: {index_path}")
         else:
-            broadcast_log(session_id, "⚠️ No index path provided - test may fail")
+            # Fallback for callers outside the batch path: build the index
+            # in-line rather than running without one
+            broadcast_log(session_id, "📇 No index path provided - creating one for this test...")
+            index_result = create_index_for_repo(repo_path, session_id=session_id)
+            if index_result["success"]:
+                index_path = index_result["index_path"]
+            else:
+                broadcast_log(session_id, "⚠️ Index creation failed - test may fail")
+            env = _env_for_repo(index_path)
         
         broadcast_log(session_id, "✅ Environment variables configured")
         
@@ -551,142 +924,295 @@ def run_wingman_test(repo_path, input_file_path, inputs_path, output_path, run_n
         full_input_path = os.path.join(inputs_path, input_file_path)
         broadcast_log(session_id, f"📄 Input file: {input_file_path}")
         
-        # Run wingman test
-        wingman_cmd = [
-            config['wingman_binary_path'],
-            '-v',  # Add verbose flag
-            '-c', config['wingman_config_path'],
-            '-p', full_input_path,
-            '-s', session_id
-        ]
+        # Run wingman test (prefix holds the binary, verbose flag and config
+        # path, resolved at load_config time)
+        wingman_cmd = [*_WINGMAN_PREFIX, '-p', full_input_path, '-s', session_id]
         
         # Debug: Log the command and environment
-        print(f"Executing wingman command: {' '.join(wingman_cmd)}")
-        print(f"Working directory: {repo_path}")
-        print(f"Input file path: {full_input_path}")
-        print(f"Environment variables:")
-        for key in ['PERPLEXITY_API_KEY', 'BWM_CODE_CONTEXT_BIN_PATH', 'BWM_CODE_CONTEXT_INDEX']:
-            print(f"  {key}={env.get(key, 'NOT SET')}")
-        
+        if DEBUG:
+            logger.debug("Executing wingman command: %s", ' '.join(wingman_cmd))
+            logger.debug("Working directory: %s", repo_path)
+            logger.debug("Input file path: %s", full_input_path)
+            for key in ('PERPLEXITY_API_KEY', 'BWM_CODE_CONTEXT_BIN_PATH', 'BWM_CODE_CONTEXT_INDEX'):
+                logger.debug("  %s=%s", key, env.get(key, 'NOT SET'))
+
         broadcast_log(session_id, f"⚙️ Executing wingman analysis...")
         broadcast_log(session_id, f"🕒 Starting analysis at {datetime.now().strftime('%H:%M:%S')}")
         
-        result = subprocess.run(
+        # Stream stdout line by line instead of buffering the whole run in
+        # capture_output: tool analytics and the ```json block are collected
+        # as lines arrive, so no second full pass over the output is needed.
+        # The pipe stays in bytes mode - the full buffer is only decoded on
+        # the rare fallback paths, never just to re-encode it
+        proc = subprocess.Popen(
             wingman_cmd,
             cwd=repo_path,
             env=env,
-            capture_output=True,
-            text=True,
-            timeout=300
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
-        
-        stdout_output = result.stdout or ""
-        stderr_output = result.stderr or ""
-        
+
+        stdout_parts = []
+        stderr_parts = []
+        json_lines = []
+        json_block = None
+        in_json_block = False
+        tool_analytics = {
+            "tools_executed": [],
+            "total_execution_time": 0,
+            "tool_count": 0
+        }
+
+        def consume_stdout():
+            nonlocal json_block, in_json_block
+            for line in proc.stdout:
+                stdout_parts.append(line)
+
+                # Mirror each line to subscribers as it arrives so the GUI
+                # shows live wingman output instead of a burst at the end
+                broadcast_log(session_id, line.decode('utf-8', 'replace').rstrip('\n'))
+
+                # Accumulate tool analytics incrementally
+                tool_match = _TOOL_TIME_RE_B.search(line)
+                if tool_match:
+                    execution_time_ms = int(tool_match.group(2))
+                    tool_analytics["tools_executed"].append({
+                        "tool": tool_match.group(1).decode('ascii'),
+                        "execution_time_ms": execution_time_ms,
+                        "execution_time_s": round(execution_time_ms / 1000, 2)
+                    })
+                    tool_analytics["total_execution_time"] += execution_time_ms
+                    tool_analytics["tool_count"] += 1
+
+                # Capture the ```json block without re-scanning the stream
+                if json_block is not None:
+                    continue
+                if not in_json_block:
+                    if b'```json' in line:
+                        remainder = line.split(b'```json', 1)[1]
+                        if b'```' in remainder:
+                            json_block = remainder.split(b'```', 1)[0].strip()
+                        else:
+                            in_json_block = True
+                            if remainder.strip():
+                                json_lines.append(remainder)
+                elif b'```' in line:
+                    json_lines.append(line.split(b'```', 1)[0])
+                    json_block = b''.join(json_lines).strip()
+                    in_json_block = False
+                else:
+                    json_lines.append(line)
+
+        stdout_thread = threading.Thread(target=consume_stdout, daemon=True)
+        stderr_thread = threading.Thread(
+            target=lambda: stderr_parts.append(proc.stderr.read()),
+            daemon=True
+        )
+        stdout_thread.start()
+        stderr_thread.start()
+
+        try:
+            proc.wait(timeout=300)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            stdout_output = b''.join(stdout_parts)
+            raise
+
+        stdout_thread.join(timeout=10)
+        stderr_thread.join(timeout=10)
+        stdout_output = b''.join(stdout_parts)
+        stderr_output = (stderr_parts[0] if stderr_parts else b'').decode('utf-8', 'replace')
+
+        # Derived seconds total rendered by the GUI, same as
+        # extract_tool_analytics sets on its result
+        tool_analytics["total_execution_time_s"] = round(
+            tool_analytics["total_execution_time"] / 1000, 2)
+
         # Debug: Log the result
-        print(f"Return code: {result.returncode}")
-        print(f"STDOUT: {stdout_output[:500]}...")
-        print(f"STDERR: {stderr_output[:500]}...")
-        
+        if DEBUG:
+            logger.debug("Return code: %s", proc.returncode)
+            logger.debug("STDOUT: %s...", stdout_output[:500])
+            logger.debug("STDERR: %s...", stderr_output[:500])
+
         end_time = time.time()
         duration = end_time - start_time
-        
+        # One datetime for everything downstream - the response timestamp and
+        # the saved-file names share it instead of re-asking the clock
+        completed_at = datetime.now()
+        now_iso = completed_at.isoformat()
+        timestamp_fs = completed_at.strftime("%Y%m%d_%H%M%S")
+
         # Log completion status
-        if result.returncode == 0:
+        if proc.returncode == 0:
             broadcast_log(session_id, f"✅ Analysis completed successfully in {duration:.1f}s")
         else:
-            broadcast_log(session_id, f"❌ Analysis failed (exit code: {result.returncode}) after {duration:.1f}s")
+            broadcast_log(session_id, f"❌ Analysis failed (exit code: {proc.returncode}) after {duration:.1f}s")
             if stderr_output:
                 broadcast_log(session_id, f"💥 Error: {stderr_output[:200]}...")
-        
-        # Always save raw output to files
+
+        # Always save raw output to files (written in the background so this
+        # worker is free for the next test while the disk write completes)
         broadcast_log(session_id, "💾 Saving raw output to disk...")
-        saved_files = save_raw_output(output_path, repo_path, input_file_path, run_number, stdout_output, stderr_output, result.returncode == 0)
+        saved_files = save_raw_output_async(output_path, repo_path, input_file_path, run_number, stdout_output, stderr_output, proc.returncode == 0, timestamp_fs)
         if saved_files:
             broadcast_log(session_id, f"✅ Raw output saved: {saved_files.get('stdout_file', 'N/A')}")
-        
+
         # Parse and analyze results
         broadcast_log(session_id, "🔍 Parsing analysis results...")
-        
-        # Parse JSON output - extract content from backticks
-        try:
-            # Extract JSON from backticks
-            clean_json = extract_json_from_output(stdout_output)
+
+        # Parse JSON output - prefer the block captured while streaming.
+        # The fence came off the raw byte stream, so it can still carry ANSI
+        # escapes; strip those before parsing, and if the block doesn't parse
+        # (spinner contamination, truncated fence) fall through to the full
+        # extraction ladder over the cleaned buffer instead of giving up
+        output = None
+        if json_block:
+            try:
+                block_text = json_block.decode('utf-8', 'replace')
+                if '\x1b' in block_text:
+                    block_text = _strip_ansi_fast(block_text)
+                output = orjson.loads(block_text)
+            except Exception:
+                output = None
+        if output is None:
+            stdout_text = stdout_output.decode('utf-8', 'replace')
+            clean_json = extract_json_from_output(stdout_text)
             if clean_json:
-                output = json.loads(clean_json)
+                try:
+                    output = orjson.loads(clean_json)
+                except Exception as e:
+                    output = {"raw_output": stdout_text, "parse_error": str(e)}
             else:
-                output = {"raw_output": stdout_output}
-        except Exception as e:
-            output = {"raw_output": stdout_output, "parse_error": str(e)}
-        
-        # Extract tool analytics from raw output
-        tool_analytics = extract_tool_analytics(stdout_output)
-        
+                output = {"raw_output": stdout_text}
+
         response = {
-            "success": result.returncode == 0,
+            "success": proc.returncode == 0,
             "output": output,
-            "raw_output": clean_raw_output(stdout_output),  # Send cleaned output to frontend
-            "raw_error": stderr_output,
             "tool_analytics": tool_analytics,
-            "error": stderr_output if result.returncode != 0 else None,
+            "error": stderr_output if proc.returncode != 0 else None,
             "duration": duration,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso,
             "session_id": session_id,
             "commands": {
                 "wingman": " ".join(wingman_cmd),
                 "index_path": index_path
-            }
+            } if DEBUG else None
         }
         
+        # Raw payloads double the response size, so they are only included
+        # on request (the full output is always saved to disk regardless)
+        if include_raw:
+            # Send cleaned output to frontend
+            response["raw_output"] = clean_raw_output(stdout_output.decode('utf-8', 'replace'))
+            response["raw_error"] = stderr_output
+
         # Add saved file info
         if saved_files:
             response["saved_files"] = saved_files
-        
+
         return response
-        
+
     except subprocess.TimeoutExpired:
         # Save raw output even for timeouts
         error_msg = "Test timed out after 5 minutes"
-        save_raw_output(output_path, repo_path, input_file_path, run_number, stdout_output, error_msg, False)
-        return {
+        error_at = datetime.now()
+        save_raw_output(output_path, repo_path, input_file_path, run_number, stdout_output, error_msg, False, error_at.strftime("%Y%m%d_%H%M%S"))
+        response = {
             "success": False,
             "output": {},
-            "raw_output": stdout_output,
-            "raw_error": error_msg,
             "tool_analytics": {},
             "error": error_msg,
             "duration": 300,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": error_at.isoformat(),
             "session_id": session_id
         }
+        if include_raw:
+            response["raw_output"] = stdout_output.decode('utf-8', 'replace')
+            response["raw_error"] = error_msg
+        return response
     except Exception as e:
         # Save raw output even for exceptions
         error_msg = str(e)
-        save_raw_output(output_path, repo_path, input_file_path, run_number, stdout_output, error_msg, False)
-        return {
+        error_at = datetime.now()
+        save_raw_output(output_path, repo_path, input_file_path, run_number, stdout_output, error_msg, False, error_at.strftime("%Y%m%d_%H%M%S"))
+        response = {
             "success": False,
             "output": {},
-            "raw_output": stdout_output,
-            "raw_error": error_msg,
             "tool_analytics": {},
             "error": error_msg,
             "duration": time.time() - start_time,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": error_at.isoformat(),
             "session_id": session_id
         }
+        if include_raw:
+            response["raw_output"] = stdout_output.decode('utf-8', 'replace')
+            response["raw_error"] = error_msg
+        return response
 
-def run_tests_for_repo(repo_config, session_id=None):
+# One persistent executor feeds every test across all repositories from a
+# single work queue, so a straggler in one repo no longer idles workers that
+# could already be running the next repo's tests. Created lazily once the
+# config is known and reused across requests; per-test envs carry their own
+# index path, so no cross-repo serialization is needed.
+_TEST_EXECUTOR = None
+_TEST_EXECUTOR_WORKERS = 0
+_TEST_EXECUTOR_LOCK = threading.Lock()
+
+def _test_executor():
+    global _TEST_EXECUTOR, _TEST_EXECUTOR_WORKERS
+    if _TEST_EXECUTOR is None:
+        with _TEST_EXECUTOR_LOCK:
+            if _TEST_EXECUTOR is None:
+                cfg = config or {}
+                # Explicit parallel_workers wins; otherwise size for
+                # subprocess-bound work - 2x cores, capped like the stdlib
+                # default, since workers mostly wait on wingman
+                max_workers = (cfg.get('parallel_workers')
+                               or min(32, (os.cpu_count() or 1) * 2))
+                _TEST_EXECUTOR_WORKERS = max_workers
+                # 'process' runs each test (and its CPU-bound regex/JSON
+                # post-processing) on a separate interpreter, bypassing the
+                # GIL. Live log streaming only works in-process, so 'thread'
+                # stays the default. Workers load the config once at spawn
+                # via the initializer rather than on their first task.
+                if cfg.get('worker_pool') == 'process':
+                    _TEST_EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=max_workers, initializer=load_config)
+                else:
+                    _TEST_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=max_workers, thread_name_prefix='test')
+    return _TEST_EXECUTOR
+
+# Shared scaffold for failure results: the invariant fields live in one
+# module-level dict and each failure layers its specifics on top, so the
+# error path allocates a single dict instead of rebuilding the boilerplate
+_ERR_TEMPLATE = {
+    "success": False,
+    "output": {},
+    "raw_output": "",
+    "tool_analytics": {},
+    "duration": 0
+}
+
+def run_tests_for_repo(repo_config, session_id=None, include_raw=False, input_files=None):
     """Run all tests for a single repository with shared index"""
     if session_id is None:
         session_id = str(uuid.uuid4())
-    
+
     repo_path = repo_config['repo_path']
     inputs_path = repo_config['inputs_path']
     output_path = repo_config['output_path']
     branch_name = repo_config.get('branch')
-    
+    run_count = config['run_count']  # Invariant across every loop below
+
+    # The batch path hands us a precomputed listing; standalone callers scan
+    # here (cheap for warm directories thanks to the mtime cache)
+    if input_files is None:
+        input_files = get_input_files(inputs_path)
+
     results = []
-    
+
     try:
         # Step 1: Create index once for this repo/branch
         broadcast_log(session_id, f"📦 Starting optimized test suite for repository: {repo_path}")
@@ -694,21 +1220,17 @@ def run_tests_for_repo(repo_config, session_id=None):
         
         if not index_result["success"]:
             # Index creation failed - all tests for this repo will fail
-            input_files = get_input_files(inputs_path)
+            error_ts = datetime.now().isoformat()  # One timestamp for the whole batch
             for input_file in input_files:
-                for run in range(1, config['run_count'] + 1):
+                for run in range(1, run_count + 1):
                     results.append({
+                        **_ERR_TEMPLATE,
                         "repo": repo_path,
                         "input_file": input_file,
                         "run_number": run,
-                        "success": False,
-                        "output": {},
-                        "raw_output": "",
                         "raw_error": index_result["error"],
-                        "tool_analytics": {},
                         "error": f"Index creation failed: {index_result['error']}",
-                        "duration": 0,
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": error_ts,
                         "session_id": session_id,
                         "index_creation_failed": True,
                         **index_result
@@ -717,102 +1239,102 @@ def run_tests_for_repo(repo_config, session_id=None):
         
         # Step 2: Get the index path and run all tests
         index_path = index_result["index_path"]
+        repo_env = _env_for_repo(index_path)  # One env dict for every test in this repo
         broadcast_log(session_id, f"🎯 Index ready! Running all tests with shared index...")
+        broadcast_log(session_id, f"📋 Found {len(input_files)} input files, {run_count} runs each")
+        
+        # Prepare all test tasks. Records carry only the per-task fields
+        # (input file, run, session id); the repo-invariant paths and index
+        # stay in locals instead of being duplicated into every task
+        test_tasks = [
+            (input_file, run, f"{session_id}_test_{i}")  # Unique session per test
+            for i, (input_file, run) in enumerate(
+                itertools.product(input_files, range(1, run_count + 1)))
+        ]
+
+        broadcast_log(session_id, f"🚀 Executing {len(test_tasks)} tests in parallel...")
         
-        # Get all input files
-        input_files = get_input_files(inputs_path)
-        broadcast_log(session_id, f"📋 Found {len(input_files)} input files, {config['run_count']} runs each")
-        
-        # Prepare all test tasks for parallel execution
-        test_tasks = []
-        for input_file in input_files:
-            for run in range(1, config['run_count'] + 1):
-                test_tasks.append({
-                    "repo_path": repo_path,
+        # Execute tests on the shared persistent executor; tasks from this
+        # repo interleave with any other repo's tasks on one work queue.
+        # Completions land on a queue via done-callbacks and are drained
+        # FIFO, so there's no future_to_task dict held for the whole batch
+        # and no as_completed waiter churn per completion.
+        executor = _test_executor()
+        done_queue = queue.SimpleQueue()
+        # Bound in-flight submissions to 2x the worker count so a large
+        # files x runs product doesn't enqueue hundreds of pending
+        # subprocess launches at once; each completion frees one slot
+        submit_gate = threading.BoundedSemaphore(_TEST_EXECUTOR_WORKERS * 2)
+        for task in test_tasks:
+            input_file, run_number, task_session_id = task
+            submit_gate.acquire()
+            future = executor.submit(
+                run_wingman_test,
+                repo_path,
+                input_file,
+                inputs_path,
+                output_path,
+                run_number,
+                index_path,
+                task_session_id,
+                include_raw,
+                repo_env
+            )
+            future.add_done_callback(
+                lambda f, t=task: (submit_gate.release(), done_queue.put((t, f))))
+
+        # Collect results in completion order
+        completed = 0
+        while completed < len(test_tasks):
+            task, future = done_queue.get()
+            input_file, run_number, task_session_id = task
+            completed += 1
+
+            try:
+                result = future.result()
+                results.append({
+                    "repo": repo_path,
                     "input_file": input_file,
-                    "inputs_path": inputs_path,
-                    "output_path": output_path,
-                    "run_number": run,
-                    "index_path": index_path,
-                    "session_id": f"{session_id}_test_{len(test_tasks)}"  # Unique session per test
+                    "run_number": run_number,
+                    **result
                 })
-        
-        broadcast_log(session_id, f"🚀 Executing {len(test_tasks)} tests in parallel...")
-        
-        # Execute tests in parallel using the shared index
-        max_workers = config.get('parallel_workers', 3)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_task = {
-                executor.submit(
-                    run_wingman_test,
-                    task["repo_path"],
-                    task["input_file"],
-                    task["inputs_path"],
-                    task["output_path"],
-                    task["run_number"],
-                    task["index_path"],
-                    task["session_id"]
-                ): task for task in test_tasks
-            }
-            
-            # Collect results as they complete
-            completed = 0
-            for future in concurrent.futures.as_completed(future_to_task):
-                task = future_to_task[future]
-                completed += 1
-                
-                try:
-                    result = future.result()
-                    results.append({
-                        "repo": repo_path,
-                        "input_file": task["input_file"],
-                        "run_number": task["run_number"],
-                        **result
-                    })
-                    
-                    # Log progress
-                    status = "✅" if result.get("success", False) else "❌"
-                    broadcast_log(session_id, f"{status} Test {completed}/{len(test_tasks)} completed: {task['input_file']} run {task['run_number']}")
-                    
-                except Exception as exc:
-                    results.append({
-                        "repo": repo_path,
-                        "input_file": task["input_file"],
-                        "run_number": task["run_number"],
-                        "success": False,
-                        "output": {},
-                        "raw_output": "",
-                        "raw_error": str(exc),
-                        "tool_analytics": {},
-                        "error": str(exc),
-                        "duration": 0,
-                        "timestamp": datetime.now().isoformat(),
-                        "session_id": task["session_id"]
-                    })
-                    broadcast_log(session_id, f"❌ Test {completed}/{len(test_tasks)} failed with exception: {task['input_file']} run {task['run_number']}")
-        
+
+                # Log progress
+                status = "✅" if result.get("success", False) else "❌"
+                broadcast_log(session_id, f"{status} Test {completed}/{len(test_tasks)} completed: {input_file} run {run_number}")
+
+            except Exception as exc:
+                error_msg = str(exc)  # Formatted once, used twice
+                results.append({
+                    **_ERR_TEMPLATE,
+                    "repo": repo_path,
+                    "input_file": input_file,
+                    "run_number": run_number,
+                    "raw_error": error_msg,
+                    "error": error_msg,
+                    "timestamp": _now_iso(),
+                    "session_id": task_session_id
+                })
+                broadcast_log(session_id, f"❌ Test {completed}/{len(test_tasks)} failed with exception: {input_file} run {run_number}")
+
         broadcast_log(session_id, f"🏁 Repository {repo_path} completed: {len(results)} tests finished")
         return results
         
     except Exception as e:
         broadcast_log(session_id, f"💥 Fatal error in repository {repo_path}: {str(e)}")
         # Return error results for all planned tests
-        input_files = get_input_files(inputs_path)
+        error_ts = datetime.now().isoformat()  # One timestamp for the whole batch
+        error_msg = str(e)
         for input_file in input_files:
-            for run in range(1, config['run_count'] + 1):
+            for run in range(1, run_count + 1):
                 results.append({
+                    **_ERR_TEMPLATE,
                     "repo": repo_path,
                     "input_file": input_file,
                     "run_number": run,
-                    "success": False,
-                    "output": {},
-                    "raw_output": "",
-                    "raw_error": str(e),
-                    "tool_analytics": {},
-                    "error": str(e),
-                    "duration": 0,
-                    "timestamp": datetime.now().isoformat(),
+                    "raw_error": error_msg,
+                    "error": error_msg,
+                    "timestamp": error_ts,
                     "session_id": session_id,
                     "repo_level_error": True
                 })
@@ -869,14 +1391,14 @@ def stream_logs(session_id):
 @app.route('/api/logs/<session_id>')
 def get_logs(session_id):
     """Get existing logs for a session"""
-    with log_lock:
-        logs = active_logs.get(session_id, [])
-        return jsonify({"logs": logs, "session_id": session_id})
+    with _session_lock(session_id):
+        logs = list(active_logs.get(session_id, ()))
+    return jsonify({"logs": logs, "session_id": session_id})
 
 @app.route('/api/run-test', methods=['POST'])
 def run_test():
     """Run a single test - uses optimized approach if creating index, or standalone mode"""
-    if not config and not load_config():
+    if config is None and not load_config():
         return jsonify({"error": "Configuration not loaded"}), 500
     
     data = request.json
@@ -894,10 +1416,13 @@ def run_test():
     
     # Get session_id from request data (frontend provides it now)
     session_id = data.get('session_id')
-    
+
+    # Raw stdout/stderr payloads are opt-in to keep responses small
+    include_raw = request.args.get('include_raw') == '1'
+
     # Check if index_path is provided (optimized mode)
     index_path = data.get('index_path')
-    
+
     if index_path:
         # Use existing index
         result = run_wingman_test(
@@ -907,7 +1432,8 @@ def run_test():
             data['output_path'],
             data['run_number'],
             index_path,
-            session_id
+            session_id,
+            include_raw
         )
     else:
         # Single test mode - create index for this test only (legacy fallback)
@@ -944,43 +1470,186 @@ def run_test():
             data['output_path'],
             data['run_number'],
             index_result["index_path"],
-            session_id
+            session_id,
+            include_raw
         )
-    
+
     return jsonify(result)
 
+def _iter_all_results(master_session_id, include_raw=False):
+    """Run every repository's tests, yielding each result dict as its
+    repository batch completes. Repositories now run concurrently: the old
+    sequential loop existed to avoid BWM_CODE_CONTEXT_INDEX collisions, but
+    each test builds its own env dict with an explicit index path, so there
+    is no shared state left to serialize around. Threads (not processes)
+    keep log broadcasting in-process for the SSE stream."""
+    repos = config['repos']
+    broadcast_log(master_session_id, f"🎬 Starting optimized test suite execution")
+    broadcast_log(master_session_id, f"📊 Processing {len(repos)} repositories")
+
+    # Scan each distinct inputs directory exactly once up front; repos
+    # sharing a directory reuse the listing and nothing rescans mid-run
+    inputs_by_path = {}
+    for repo in repos:
+        path = repo['inputs_path']
+        if path not in inputs_by_path:
+            inputs_by_path[path] = get_input_files(path)
+
+    repo_workers = max(1, min(len(repos), os.cpu_count() or 1))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=repo_workers) as executor:
+        future_to_index = {}
+        for repo_index, repo in enumerate(repos, 1):
+            repo_session_id = f"{master_session_id}_repo_{repo_index}"
+            broadcast_log(master_session_id, f"📦 [{repo_index}/{len(repos)}] Starting repository: {repo['repo_path']}")
+            future = executor.submit(run_tests_for_repo, repo, repo_session_id,
+                                     include_raw, inputs_by_path[repo['inputs_path']])
+            future_to_index[future] = repo_index
+
+        for future in concurrent.futures.as_completed(future_to_index):
+            repo_index = future_to_index[future]
+            repo_results = future.result()
+
+            # Summary for this repository
+            success_count = sum(1 for r in repo_results if r.get('success', False))
+            total_count = len(repo_results)
+            broadcast_log(master_session_id, f"✅ [{repo_index}/{len(repos)}] Repository completed: {success_count}/{total_count} tests passed")
+
+            yield from repo_results
+
+# In-process job registry for async batch runs: /api/run-all?async=1 returns
+# a job id immediately and the suite runs on a background thread; clients
+# poll /api/jobs/<id> (and can follow the live logs via the master session).
+# A bounded deque of finished job ids caps registry growth.
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+_FINISHED_JOBS = collections.deque(maxlen=50)
+
+def _run_suite_job(job, include_raw):
+    """Background-thread body for an async /api/run-all job"""
+    master_session_id = job["master_session_id"]
+    try:
+        results = list(_iter_all_results(master_session_id, include_raw))
+        total = len(results)
+        success = sum(1 for r in results if r.get('success', False))
+        broadcast_log(master_session_id, f"🏆 Test suite completed: {success}/{total} tests passed")
+        job["results"] = results
+        job["summary"] = {
+            "total_tests": total,
+            "successful_tests": success,
+            "failed_tests": total - success,
+            "success_rate": round((success / total * 100) if total > 0 else 0, 1)
+        }
+        job["state"] = "finished"
+    except Exception as e:
+        broadcast_log(master_session_id, f"💥 Test suite failed: {e}")
+        job["error"] = str(e)
+        job["state"] = "failed"
+    finally:
+        with _JOBS_LOCK:
+            _FINISHED_JOBS.append(job["job_id"])
+            if len(_FINISHED_JOBS) == _FINISHED_JOBS.maxlen:
+                stale = _FINISHED_JOBS[0]
+                if stale != job["job_id"]:
+                    _JOBS.pop(stale, None)
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Poll the state (and, once finished, the results) of an async run"""
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job)
+
 @app.route('/api/run-all', methods=['POST'])
 def run_all_tests():
     """Run all tests using optimized approach: create index once per repository"""
-    if not config and not load_config():
+    if config is None and not load_config():
         return jsonify({"error": "Configuration not loaded"}), 500
-    
-    all_results = []
+
     master_session_id = str(uuid.uuid4())  # Master session for overall progress
-    
-    broadcast_log(master_session_id, f"🎬 Starting optimized test suite execution")
-    broadcast_log(master_session_id, f"📊 Processing {len(config['repos'])} repositories")
-    
-    # Process each repository sequentially (but tests within each repo run in parallel)
-    for repo_index, repo in enumerate(config['repos'], 1):
-        repo_session_id = f"{master_session_id}_repo_{repo_index}"
-        
-        broadcast_log(master_session_id, f"📦 [{repo_index}/{len(config['repos'])}] Starting repository: {repo['repo_path']}")
-        
-        # Run all tests for this repository with shared index
-        repo_results = run_tests_for_repo(repo, repo_session_id)
-        all_results.extend(repo_results)
-        
-        # Summary for this repository
-        success_count = sum(1 for r in repo_results if r.get('success', False))
-        total_count = len(repo_results)
-        broadcast_log(master_session_id, f"✅ [{repo_index}/{len(config['repos'])}] Repository completed: {success_count}/{total_count} tests passed")
-    
+
+    # Raw stdout/stderr payloads are opt-in to keep responses small
+    include_raw = request.args.get('include_raw') == '1'
+
+    # Async mode: kick the suite off on a background thread and return a job
+    # id immediately instead of pinning an HTTP worker for the whole run
+    if request.args.get('async') == '1':
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "state": "running",
+            "master_session_id": master_session_id,
+            "created_at": datetime.now().isoformat(),
+            "results": None,
+            "summary": None,
+            "error": None
+        }
+        with _JOBS_LOCK:
+            _JOBS[job_id] = job
+        threading.Thread(target=_run_suite_job, args=(job, include_raw),
+                         daemon=True, name=f"job-{job_id[:8]}").start()
+        return jsonify({"job_id": job_id, "state": "running",
+                        "master_session_id": master_session_id}), 202
+
+    # Streaming modes: emit each result as it becomes available instead of
+    # holding every raw output in memory until the end. stream=1 keeps the
+    # usual {"results": [...]} envelope; stream=ndjson emits one JSON row
+    # per line (terminated by a summary row), which line-oriented consumers
+    # can parse without buffering the whole response.
+    stream_mode = request.args.get('stream')
+    if stream_mode == 'ndjson':
+        def generate_ndjson():
+            total = success = 0
+            for result in _iter_all_results(master_session_id, include_raw):
+                total += 1
+                if result.get('success', False):
+                    success += 1
+                yield orjson.dumps(result) + b'\n'
+            broadcast_log(master_session_id, f"🏆 Test suite completed: {success}/{total} tests passed")
+            yield orjson.dumps({
+                "master_session_id": master_session_id,
+                "summary": {
+                    "total_tests": total,
+                    "successful_tests": success,
+                    "failed_tests": total - success,
+                    "success_rate": round((success / total * 100) if total > 0 else 0, 1)
+                }
+            }) + b'\n'
+
+        return Response(stream_with_context(generate_ndjson()),
+                        mimetype='application/x-ndjson')
+
+    if stream_mode == '1':
+        def generate():
+            total = success = 0
+            yield '{"results":['
+            for result in _iter_all_results(master_session_id, include_raw):
+                if total:
+                    yield ','
+                total += 1
+                if result.get('success', False):
+                    success += 1
+                yield orjson.dumps(result).decode()
+            broadcast_log(master_session_id, f"🏆 Test suite completed: {success}/{total} tests passed")
+            summary = {
+                "total_tests": total,
+                "successful_tests": success,
+                "failed_tests": total - success,
+                "success_rate": round((success / total * 100) if total > 0 else 0, 1)
+            }
+            yield ('],"master_session_id":' + orjson.dumps(master_session_id).decode()
+                   + ',"summary":' + orjson.dumps(summary).decode() + '}')
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    all_results = list(_iter_all_results(master_session_id, include_raw))
+
     # Final summary
     total_tests = len(all_results)
     total_success = sum(1 for r in all_results if r.get('success', False))
     broadcast_log(master_session_id, f"🏆 Test suite completed: {total_success}/{total_tests} tests passed")
-    
+
     return jsonify({
         "results": all_results,
         "master_session_id": master_session_id,
@@ -1001,5 +1670,16 @@ if __name__ == '__main__':
             print(f"  {repo['repo_path']}: {len(inputs)} input files")
     else:
         print("Warning: Could not load configuration")
-    
-    app.run(debug=True, host='0.0.0.0', port=9000)
+
+    if os.environ.get('ZAP_DEV'):
+        # Werkzeug dev server with reloader/debugger, for local hacking only
+        app.run(debug=True, host='0.0.0.0', port=9000)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            # No waitress installed - at least run the dev server threaded
+            # and without the debug reloader's double-import overhead
+            app.run(host='0.0.0.0', port=9000, threaded=True)
+        else:
+            serve(app, host='0.0.0.0', port=9000, threads=16)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+WSGI entrypoint for Zap Suite
+
+The Flask dev server (python server.py) handles one request at a time; for
+concurrent GUI usage run a production WSGI server instead:
+
+    gunicorn --workers=2 --threads=8 --timeout=360 wsgi:app
+
+Threads are preferred over extra workers because requests spend most of
+their time blocked in wingman subprocesses, where the GIL is released.
+
+Each SSE subscriber (/api/logs/stream/<id>) pins a thread for the life
+of the connection. With many concurrent log viewers, run gevent workers
+instead so subscribers are greenlets rather than OS threads:
+
+    gunicorn -k gevent -w 4 --worker-connections 1000 --timeout 360 wsgi:app
+
+gunicorn's gevent worker applies the monkey-patching itself before this
+module is imported, which makes the blocking queue get() in the SSE
+generator cooperative; no code changes are needed here.
+"""
+
+from server import app
+
+# Some WSGI servers look for the callable under this name
+application = app